@@ -6,7 +6,6 @@ from src.data.preprocessor import DataPreprocessor
 def collect_and_store_data():
     """Fetch, clean, and store EURUSD 15-min data."""
     # Initialize components
-    api_client = MT5APIClient()
     db_manager = DBManager()
     preprocessor = DataPreprocessor()
 
@@ -14,8 +13,9 @@ def collect_and_store_data():
     start_date = datetime(2020, 1, 1)
     end_date = datetime(2024, 12, 31)
 
-    # Fetch data
-    candles = api_client.fetch_historical_data(start_date, end_date)
+    # Fetch data over a single MT5 connection
+    with MT5APIClient() as api_client:
+        candles = api_client.fetch_historical_data(start_date, end_date)
 
     # Clean data
     cleaned_candles = preprocessor.clean_data(candles)
@@ -1,10 +1,11 @@
+import logging
 from src.environment.trading_env import TradingEnv
 from stable_baselines3 import PPO
 import pandas as pd
 
-def test_ppo(model_path="models/ppo_alphapulse.zip", episodes=10):
-    # Initialize environment
-    env = TradingEnv()
+def test_ppo(model_path="models/ppo_alphapulse.zip", episodes=10, render=False):
+    # Initialize environment (step logs are only needed when rendering)
+    env = TradingEnv(log_level=logging.INFO if render else logging.WARNING)
     
     # Load model
     model = PPO.load(model_path)
@@ -34,7 +35,8 @@ def test_ppo(model_path="models/ppo_alphapulse.zip", episodes=10):
             profits.append(profit)
             drawdowns.append(max(daily_drawdown, overall_drawdown))
             
-            env.render()
+            if render:
+                env.render()
         
         results.append({
             "episode": episode + 1,
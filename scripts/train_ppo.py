@@ -1,7 +1,20 @@
+import os
+# Single-threaded BLAS/OpenMP leaves the CPU cores to the rollout workers (set before torch loads)
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("MKL_NUM_THREADS", "1")
+import argparse
+import torch
 from src.environment.trading_env import TradingEnv
 from stable_baselines3 import PPO
 from stable_baselines3.common.env_checker import check_env
+from stable_baselines3.common.env_util import make_vec_env
 from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+
+# Samples per PPO rollout summed over all envs, and minibatches per epoch.
+# Keeping both fixed means adding envs speeds up collection without changing the update.
+TOTAL_ROLLOUT = 4096
+N_MINIBATCHES = 32
 
 class LoggingCallback(BaseCallback):
     def __init__(self, verbose=0):
@@ -10,20 +23,38 @@ class LoggingCallback(BaseCallback):
         self.episode_lengths = []
 
     def _on_step(self) -> bool:
-        if self.locals["dones"][0]:
-            ep_rew = self.locals["infos"][0].get("episode", {}).get("r", 0)
-            ep_len = self.locals["infos"][0].get("episode", {}).get("l", 0)
-            self.episode_rewards.append(ep_rew)
-            self.episode_lengths.append(ep_len)
-            print(f"Episode {len(self.episode_rewards)}: Reward = {ep_rew:.2f}, Length = {ep_len}")
+        for done, info in zip(self.locals["dones"], self.locals["infos"]):
+            if done:
+                ep_rew = info.get("episode", {}).get("r", 0)
+                ep_len = info.get("episode", {}).get("l", 0)
+                self.episode_rewards.append(ep_rew)
+                self.episode_lengths.append(ep_len)
+                print(f"Episode {len(self.episode_rewards)}: Reward = {ep_rew:.2f}, Length = {ep_len}")
         return True
 
-def train_ppo():
-    # Initialize environment
-    env = TradingEnv()
+def train_ppo(num_envs=8, large_policy=False):
+    if num_envs < 1 or TOTAL_ROLLOUT % num_envs != 0:
+        raise ValueError(f"num_envs must be a positive divisor of TOTAL_ROLLOUT ({TOTAL_ROLLOUT}), got {num_envs}")
+    
+    # Check environment (also warms the on-disk data cache before workers start)
+    check_env(TradingEnv())
+    
+    # Initialize vectorized environment: DummyVecEnv avoids IPC overhead for few envs
+    vec_env_cls = DummyVecEnv if num_envs <= 4 else SubprocVecEnv
+    env = make_vec_env(TradingEnv, n_envs=num_envs, vec_env_cls=vec_env_cls)
+    
+    # The default MLP on a 7-dim observation trains faster on CPU than over GPU transfers
+    if large_policy:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        policy_kwargs = dict(net_arch=[256, 256])
+    else:
+        torch.set_num_threads(1)
+        device = "cpu"
+        policy_kwargs = None
     
-    # Check environment
-    check_env(env)
+    # Split the rollout budget across envs so batch statistics do not grow with num_envs
+    n_steps = TOTAL_ROLLOUT // num_envs
+    batch_size = n_steps * num_envs // N_MINIBATCHES
     
     # Initialize PPO
     model = PPO(
@@ -31,20 +62,27 @@ def train_ppo():
         env,
         verbose=1,
         learning_rate=0.0005,  # Increased from 0.0003
-        n_steps=4096,          # Increased from 2048
-        batch_size=128,        # Increased from 64
+        n_steps=n_steps,       # TOTAL_ROLLOUT per rollout, split across envs
+        batch_size=batch_size, # 128 with the default budget (increased from 64)
         n_epochs=15,           # Increased from 10
         gamma=0.99,
+        policy_kwargs=policy_kwargs,
+        device=device,
         tensorboard_log="./tensorboard/"
     )
     
     # Train with callback
     callback = LoggingCallback()
     model.learn(total_timesteps=500000, progress_bar=True, callback=callback, tb_log_name="ppo_alphapulse_v2")
+    env.close()
     
     # Save model
     model.save("models/ppo_alphapulse_v2")
     print("Model saved to models/ppo_alphapulse_v2.zip")
 
 if __name__ == "__main__":
-    train_ppo()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train PPO on the EURUSD trading environment")
+    parser.add_argument("--num-envs", type=int, default=8, help="Number of parallel environments")
+    parser.add_argument("--large-policy", action="store_true", help="Use a 256x256 policy network on CUDA")
+    args = parser.parse_args()
+    train_ppo(num_envs=args.num_envs, large_policy=args.large_policy)
@@ -1,10 +1,10 @@
 import MetaTrader5 as mt5
+import numpy as np
 import yaml
 import os
 from datetime import datetime, timedelta
 import logging
 import time
-import pytz
 from src.utils.logger import setup_logger
 
 class MT5APIClient:
@@ -24,13 +24,14 @@ class MT5APIClient:
         self.timeframe = mt5.TIMEFRAME_M15
         self.max_retries = 3
         self.retry_delay = 5
-        self.eet_tz = pytz.timezone("EET")
+        self.connected = False
 
     def initialize(self):
         """Initialize MT5 connection."""
         for attempt in range(1, self.max_retries + 1):
             try:
                 if mt5.initialize(login=self.login, password=self.password, server=self.server):
+                    self.connected = True
                     self.logger.info("MT5 initialized successfully")
                     print("MT5 initialized successfully")
                     return True
@@ -46,76 +47,92 @@ class MT5APIClient:
                     time.sleep(self.retry_delay)
         return False
 
-    def fetch_candles(self, start_date, end_date):
-        """Fetch candlestick data for a date range."""
+    def shutdown(self):
+        """Close MT5 connection."""
+        mt5.shutdown()
+        self.connected = False
+        self.logger.info("MT5 connection closed")
+        print("MT5 connection closed")
+
+    def __enter__(self):
+        """Open one MT5 connection for all fetches in the block."""
         if not self.initialize():
-            self.logger.error("Cannot fetch data: MT5 initialization failed")
-            print("Cannot fetch data: MT5 initialization failed")
-            return []
+            self.logger.error("MT5 initialization failed")
+            raise ConnectionError("MT5 initialization failed")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+        return False
+
+    def fetch_candles(self, start_date, end_date):
+        """Fetch candlestick data for a date range as the raw MT5 rates array.
 
+        Expects an open MT5 connection (use the client as a context manager).
+        """
         try:
             utc_from = start_date
             utc_to = end_date
             self.logger.info(f"Fetching data from {utc_from} to {utc_to}")
             print(f"Fetching data from {utc_from} to {utc_to}")
             rates = mt5.copy_rates_range(self.symbol, self.timeframe, utc_from, utc_to)
+            last_error = mt5.last_error()
             
             if rates is None or len(rates) == 0:
-                self.logger.warning(f"No data returned for {utc_from} to {utc_to}: {mt5.last_error()}")
-                print(f"No data returned for {utc_from} to {utc_to}: {mt5.last_error()}")
+                self.logger.warning(f"No data returned for {utc_from} to {utc_to}: {last_error}")
+                print(f"No data returned for {utc_from} to {utc_to}: {last_error}")
                 return []
 
-            candles = []
-            for rate in rates:
-                # Convert Unix timestamp to EET
-                eet_time = datetime.fromtimestamp(rate['time'], tz=pytz.UTC).astimezone(self.eet_tz)
-                utc_time = eet_time.astimezone(pytz.UTC)
-                candles.append({
-                    "timestamp_utc": utc_time.strftime('%Y-%m-%d %H:%M:%S'),
-                    "timestamp_eet": eet_time.strftime('%Y-%m-%d %H:%M:%S'),
-                    "open": float(rate['open']),
-                    "high": float(rate['high']),
-                    "low": float(rate['low']),
-                    "close": float(rate['close']),
-                    "volume": int(rate['tick_volume'])
-                })
-            self.logger.info(f"Fetched {len(candles)} candles for {utc_from} to {utc_to}")
-            print(f"Fetched {len(candles)} candles for {utc_from} to {utc_to}")
-            return candles
+            self.logger.info(f"Fetched {len(rates)} candles for {utc_from} to {utc_to}")
+            print(f"Fetched {len(rates)} candles for {utc_from} to {utc_to}")
+            return rates
 
         except Exception as e:
             self.logger.error(f"Error fetching candles: {e}")
             print(f"Error fetching candles: {e}")
             return []
-        finally:
-            mt5.shutdown()
-            self.logger.info("MT5 connection closed")
-            print("MT5 connection closed")
 
     def fetch_historical_data(self, start_date, end_date):
-        """Fetch historical data in yearly batches."""
-        all_candles = []
+        """Fetch historical data in yearly batches over one MT5 connection."""
+        ranges = []
         current_date = start_date.replace(day=1, month=1)
-        
         while current_date <= end_date:
             year_end = min(datetime(current_date.year, 12, 31), end_date)
-            candles = self.fetch_candles(current_date, year_end)
-            all_candles.extend(candles)
+            ranges.append((current_date, year_end))
             current_date = datetime(current_date.year + 1, 1, 1)
-            self.logger.info(f"Processed batch for {current_date.year - 1}")
-            print(f"Processed batch for {current_date.year - 1}")
-            time.sleep(2)
 
-        # Sort and deduplicate
-        all_candles = sorted(all_candles, key=lambda x: x["timestamp_utc"])
-        unique_candles = {candle["timestamp_utc"]: candle for candle in all_candles}.values()
-        self.logger.info(f"Total unique candles fetched: {len(unique_candles)}")
-        print(f"Total unique candles fetched: {len(unique_candles)}")
-        return list(unique_candles)
+        # Reuse the caller's connection if open, otherwise hold one for this call
+        owns_connection = not self.connected
+        if owns_connection and not self.initialize():
+            self.logger.error("Cannot fetch data: MT5 initialization failed")
+            print("Cannot fetch data: MT5 initialization failed")
+            return []
+
+        batches = []
+        try:
+            for batch_start, batch_end in ranges:
+                rates = self.fetch_candles(batch_start, batch_end)
+                if len(rates) > 0:
+                    batches.append(rates)
+                self.logger.info(f"Processed batch for {batch_start.year}")
+                print(f"Processed batch for {batch_start.year}")
+        finally:
+            if owns_connection:
+                self.shutdown()
+
+        if not batches:
+            return []
+        # Sort and deduplicate on candle time, keeping the last occurrence (as clean_data does)
+        all_rates = np.concatenate(batches)
+        _, last_idx = np.unique(all_rates["time"][::-1], return_index=True)
+        unique_rates = all_rates[len(all_rates) - 1 - last_idx]
+        self.logger.info(f"Total unique candles fetched: {len(unique_rates)}")
+        print(f"Total unique candles fetched: {len(unique_rates)}")
+        return unique_rates
 
 if __name__ == "__main__":
-    client = MT5APIClient()
     start = datetime(2024, 1, 1)
     end = datetime(2024, 1, 31)
-    candles = client.fetch_historical_data(start, end)
+    with MT5APIClient() as client:
+        candles = client.fetch_historical_data(start, end)
     print(f"Candles fetched: {len(candles)}")
\ No newline at end of file
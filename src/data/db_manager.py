@@ -1,5 +1,12 @@
+import csv
+import io
+import os
+import numpy as np
+import pandas as pd
 import psycopg2
 import yaml
+from psycopg2.extras import execute_values
+from src.utils.helpers import candle_cache_path
 from src.utils.logger import setup_logger
 
 class DBManager:
@@ -14,6 +21,7 @@ class DBManager:
             "user": config["user"],
             "password": config["password"]
         }
+        self.cache_path = candle_cache_path(config)
         self.conn = None
         self.cursor = None
 
@@ -53,30 +61,54 @@ class DBManager:
         finally:
             self.close()
 
-    def insert_candles(self, candles):
-        """Insert candles into eurusd_15min table."""
+    def insert_candles(self, rates):
+        """Insert raw MT5 rates (structured ndarray) into eurusd_15min table."""
+        if len(rates) == 0:
+            self.logger.warning("No candles to insert")
+            return
         try:
             self.connect()
             insert_query = """
             INSERT INTO eurusd_15min (timestamp_utc, timestamp_eet, open, high, low, close, volume)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (timestamp_utc) DO NOTHING;
+            VALUES %s
+            ON CONFLICT (timestamp_utc) DO NOTHING
+            RETURNING 1;
             """
-            data = [
-                (
-                    candle["timestamp_utc"],
-                    candle["timestamp_eet"],
-                    candle["open"],
-                    candle["high"],
-                    candle["low"],
-                    candle["close"],
-                    candle["volume"]
+            # MT5 times are UTC epoch seconds; only EET needs a timezone conversion
+            utc_times = rates["time"].astype("datetime64[s]")
+            eet_times = (
+                pd.DatetimeIndex(utc_times).tz_localize("UTC").tz_convert("EET")
+                .tz_localize(None).to_numpy().astype("datetime64[s]")
+            )
+            data = list(zip(
+                np.datetime_as_string(utc_times).tolist(),
+                np.datetime_as_string(eet_times).tolist(),
+                rates["open"].tolist(),
+                rates["high"].tolist(),
+                rates["low"].tolist(),
+                rates["close"].tolist(),
+                rates["tick_volume"].tolist()
+            ))
+            self.cursor.execute("SELECT EXISTS (SELECT 1 FROM eurusd_15min);")
+            if self.cursor.fetchone()[0]:
+                inserted = len(execute_values(self.cursor, insert_query, data, page_size=10000, fetch=True))
+            else:
+                # Empty table: COPY is the fastest ingest path (rates are already deduplicated)
+                buf = io.StringIO()
+                csv.writer(buf).writerows(data)
+                buf.seek(0)
+                self.cursor.copy_expert(
+                    "COPY eurusd_15min (timestamp_utc, timestamp_eet, open, high, low, close, volume) "
+                    "FROM STDIN WITH CSV",
+                    buf
                 )
-                for candle in candles
-            ]
-            self.cursor.executemany(insert_query, data)
+                inserted = len(data)
             self.conn.commit()
-            self.logger.info(f"Inserted {self.cursor.rowcount} candles")
+            self.logger.info(f"Inserted {inserted} candles")
+            # TradingEnv's parquet snapshot of the table is now stale
+            if inserted and os.path.exists(self.cache_path):
+                os.remove(self.cache_path)
+                self.logger.info(f"Removed stale candle cache {self.cache_path}")
         except Exception as e:
             self.logger.error(f"Error inserting candles: {e}")
             raise
@@ -1,45 +1,34 @@
-import pandas as pd
+import numpy as np
 from src.utils.logger import setup_logger
 
 class DataPreprocessor:
     def __init__(self):
         self.logger = setup_logger("preprocessor", "logs/data_preprocessing.log")
 
-    def clean_data(self, candles):
-        """Clean and preprocess candlestick data."""
+    def clean_data(self, rates):
+        """Clean and preprocess raw MT5 rates (structured ndarray)."""
         try:
-            if not candles:
+            if rates is None or len(rates) == 0:
                 self.logger.warning("No candles to clean")
                 return []
 
-            # Convert to DataFrame
-            df = pd.DataFrame(candles)
+            # Remove duplicates based on time, keeping the last occurrence.
+            # np.unique also returns the times sorted, so this sorts the rates too.
+            _, last_idx = np.unique(rates["time"][::-1], return_index=True)
+            cleaned = rates[len(rates) - 1 - last_idx]
+            self.logger.info(f"Removed {len(rates) - len(cleaned)} duplicate candles")
 
-            # Ensure correct data types
-            df["timestamp_utc"] = pd.to_datetime(df["timestamp_utc"])
-            df["timestamp_eet"] = pd.to_datetime(df["timestamp_eet"])
-            df["open"] = df["open"].astype(float)
-            df["high"] = df["high"].astype(float)
-            df["low"] = df["low"].astype(float)
-            df["close"] = df["close"].astype(float)
-            df["volume"] = df["volume"].astype(int)
+            # Drop candles with missing prices; they indicate bad data, not gaps to fill
+            mask = np.zeros(len(cleaned), dtype=bool)
+            for field in ["open", "high", "low", "close"]:
+                mask |= np.isnan(cleaned[field])
+            if mask.any():
+                bad_times = np.datetime_as_string(cleaned["time"][mask].astype("datetime64[s]"))
+                self.logger.warning(f"Dropping {mask.sum()} candles with missing values at {bad_times.tolist()}")
+                cleaned = cleaned[~mask]
 
-            # Remove duplicates based on timestamp_utc
-            df = df.drop_duplicates(subset=["timestamp_utc"], keep="last")
-            self.logger.info(f"Removed {len(candles) - len(df)} duplicate candles")
-
-            # Check for missing values
-            if df.isnull().any().any():
-                self.logger.warning("Missing values detected, filling with forward fill")
-                df = df.fillna(method="ffill")
-
-            # Sort by timestamp_utc
-            df = df.sort_values("timestamp_utc")
-
-            # Convert back to list of dicts
-            cleaned_candles = df.to_dict("records")
-            self.logger.info(f"Cleaned {len(cleaned_candles)} candles")
-            return cleaned_candles
+            self.logger.info(f"Cleaned {len(cleaned)} candles")
+            return cleaned
 
         except Exception as e:
             self.logger.error(f"Error cleaning data: {e}")
@@ -47,9 +36,13 @@ class DataPreprocessor:
 
 if __name__ == "__main__":
     preprocessor = DataPreprocessor()
-    # Test with sample data
-    sample_candles = [
-        {"timestamp_utc": "2020-01-01 00:00:00", "timestamp_eet": "2020-01-01 02:00:00", "open": 1.12345, "high": 1.12350, "low": 1.12340, "close": 1.12348, "volume": 100}
+    # Test with sample data in the MT5 copy_rates_range layout
+    rates_dtype = [
+        ("time", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"), ("close", "<f8"),
+        ("tick_volume", "<u8"), ("spread", "<i4"), ("real_volume", "<u8")
     ]
-    cleaned = preprocessor.clean_data(sample_candles)
+    sample_rates = np.array([
+        (1577836800, 1.12345, 1.12350, 1.12340, 1.12348, 100, 0, 0)
+    ], dtype=rates_dtype)
+    cleaned = preprocessor.clean_data(sample_rates)
     print(cleaned)
\ No newline at end of file
@@ -1,30 +1,157 @@
+import functools
+import logging
+import os
+import connectorx as cx
 import gymnasium as gym
 import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 import yaml
-from sqlalchemy import create_engine
-from ta.trend import SMAIndicator
-from ta.momentum import RSIIndicator
+from numba import njit
+from src.utils.helpers import candle_cache_path
 from src.utils.logger import setup_logger
 
+@njit(cache=True)
+def _rsi(close, window):
+    """Wilder's RSI in a single streaming pass (matches ta's RSIIndicator)."""
+    n = len(close)
+    out = np.full(n, np.nan)
+    avg_gain = 0.0
+    avg_loss = 0.0
+    alpha = 1.0 / window
+    for i in range(1, n):
+        diff = close[i] - close[i - 1]
+        gain = diff if diff > 0 else 0.0
+        loss = -diff if diff < 0 else 0.0
+        avg_gain = avg_gain * (1 - alpha) + gain * alpha
+        avg_loss = avg_loss * (1 - alpha) + loss * alpha
+        if i >= window - 1:
+            out[i] = 100.0 if avg_loss == 0 else 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    return out
+
+# Event flags returned by _step_numba so TradingEnv.step can log outside the JIT
+EVENT_BUY = 1
+EVENT_SELL = 2
+EVENT_DAILY_DRAWDOWN = 4
+EVENT_OVERALL_DRAWDOWN = 8
+EVENT_PROFIT_TARGET = 16
+EVENT_EPISODE_END = 32
+
+@njit(cache=True)
+def _step_numba(close, trend_reward, current_step, start_step, episode_length, action,
+                position, entry_price, balance, max_equity, initial_balance, pip_value,
+                spread, daily_drawdown_limit, overall_drawdown_limit, profit_target):
+    """Advance the trading state by one bar and return the new state plus event flags."""
+    current_step += 1
+    current_price = float(close[current_step])
+    done = False
+    truncated = False
+    events = 0
+
+    # Update equity (position is -1/0/1, so it doubles as the trade direction)
+    profit = (current_price - entry_price) * position * pip_value  # Profit in USD
+    equity = balance + profit
+
+    # Calculate drawdowns
+    daily_drawdown = (max_equity - equity) / max_equity
+    overall_drawdown = (initial_balance - equity) / initial_balance
+    max_equity = max(max_equity, equity)
+
+    # Execute action; a new entry is charged the spread on this bar
+    if action == 0 and position != 1:  # Buy
+        if position == -1:  # Close short
+            balance = equity
+        position = 1
+        entry_price = current_price + spread
+        profit = -spread * pip_value
+        events |= EVENT_BUY
+    elif action == 1 and position != -1:  # Sell
+        if position == 1:  # Close long
+            balance = equity
+        position = -1
+        entry_price = current_price - spread
+        profit = -spread * pip_value
+        events |= EVENT_SELL
+
+    # Reward function: open profit plus precomputed RSI penalty / SMA trend bonus
+    reward = profit + trend_reward[position + 1, current_step]
+
+    # Check drawdown limits
+    if daily_drawdown > daily_drawdown_limit:
+        reward -= 1000  # Heavy penalty
+        done = True
+        events |= EVENT_DAILY_DRAWDOWN
+    if overall_drawdown > overall_drawdown_limit:
+        reward -= 1000
+        done = True
+        events |= EVENT_OVERALL_DRAWDOWN
+
+    # Check profit target
+    profit = (equity - initial_balance) / initial_balance
+    if profit >= profit_target:
+        reward += 1000  # Bonus
+        done = True
+        events |= EVENT_PROFIT_TARGET
+
+    # Check episode end
+    if current_step >= start_step + episode_length or current_step >= len(close) - 1:
+        done = True
+        truncated = True
+        events |= EVENT_EPISODE_END
+
+    return (current_step, reward, position, entry_price, balance,
+            equity, max_equity, done, truncated, events)
+
+@functools.lru_cache(maxsize=1)
+def _build_dataset(config_path):
+    """Load candles and add indicators once per process, shared by every TradingEnv."""
+    df = TradingEnv._load_data(config_path)
+    if df.empty:
+        # Raised rather than returned so a failed load is not cached
+        setup_logger("trading_env", "logs/trading_env.log").error("No data loaded from PostgreSQL")
+        raise ValueError("No data loaded from PostgreSQL")
+    return TradingEnv._add_indicators(df)
+
 class TradingEnv(gym.Env):
-    def __init__(self, config_path="configs/db_config.yaml", episode_length=2880):
+    def __init__(self, config_path="configs/db_config.yaml", episode_length=2880, log_level=logging.WARNING):
         super(TradingEnv, self).__init__()
         self.logger = setup_logger("trading_env", "logs/trading_env.log")
         
-        # Load data from PostgreSQL
-        self.df = self._load_data(config_path)
-        if self.df.empty:
-            self.logger.error("No data loaded from PostgreSQL")
-            raise ValueError("No data loaded from PostgreSQL")
+        # Load data with technical indicators (cached per process, treat as read-only)
+        self.df = _build_dataset(config_path)
+        
+        # Per-step info logs are costly during training, so keep them off by default
+        self.logger.setLevel(log_level)
         
-        # Add technical indicators
-        self.df = self._add_indicators()
+        # NumPy copies of the data so step() avoids per-step pandas lookups
+        features = self.df[
+            ["open", "high", "low", "close", "volume", "sma_20", "rsi_14"]
+        ].to_numpy(dtype=np.float64)
+        # Prices stay float64: they feed entry prices, equity and the drawdown checks
+        self._close = np.ascontiguousarray(features[:, 3])
+        self._sma = np.ascontiguousarray(features[:, 5])
+        self._rsi = np.ascontiguousarray(features[:, 6])
+        
+        # Standardize observations once over the full history (prices ~1.1, volume ~100s)
+        self._obs_mean = features.mean(axis=0)
+        self._obs_std = features.std(axis=0)
+        self._obs_std[self._obs_std == 0] = 1.0
+        self._obs_matrix = np.clip(
+            (features - self._obs_mean) / self._obs_std, -10, 10
+        ).astype(np.float32)
+        
+        # Reward shaping per bar, indexed by [position + 1, step] (short, flat, long):
+        # -50 for longs when RSI > 70 / shorts when RSI < 30, +10 when aligned with SMA-20
+        self._trend_reward = np.zeros((3, len(self._close)), dtype=np.float32)
+        self._trend_reward[0] = np.where(self._rsi < 30, -50, 0) + np.where(self._close < self._sma, 10, 0)
+        self._trend_reward[2] = np.where(self._rsi > 70, -50, 0) + np.where(self._close > self._sma, 10, 0)
         
         # Environment parameters
         self.episode_length = min(episode_length, len(self.df))
+        self._n_valid_starts = len(self.df) - self.episode_length
         self.initial_balance = 10000  # Match $10,000 deposit
         self.lot_size = 0.1  # Micro lot (10,000 units, ~$0.10/pip for EURUSD)
+        self.pip_value = self.lot_size * 100000.0  # Price move to USD
         self.spread = 0.00015  # 1.5 pips (IC Markets Raw Spread avg.)
         self.daily_drawdown_limit = 0.05  # 5%
         self.overall_drawdown_limit = 0.10  # 10%
@@ -32,8 +159,8 @@ class TradingEnv(gym.Env):
         
         # State and action spaces
         self.observation_space = gym.spaces.Box(
-            low=-np.inf, high=np.inf, shape=(7,), dtype=np.float32
-        )  # [open, high, low, close, volume, sma_20, rsi_14]
+            low=-10, high=10, shape=(7,), dtype=np.float32
+        )  # Standardized [open, high, low, close, volume, sma_20, rsi_14]
         self.action_space = gym.spaces.Discrete(3)  # Buy, Sell, Hold
         
         # Trading state
@@ -47,45 +174,76 @@ class TradingEnv(gym.Env):
         self.max_equity = self.initial_balance
         self.done = False
         
-    def _load_data(self, config_path):
-        """Load EURUSD 15-min data from PostgreSQL using SQLAlchemy."""
+    @classmethod
+    def _ensure_cache(cls, config_path):
+        """Export eurusd_15min to the parquet cache once, straight into Arrow via connectorx.
+
+        Returns the cache path, or None if the table is empty. DBManager.insert_candles
+        deletes the cache when new candles are stored.
+        """
+        with open(config_path, 'r') as f:
+            config = yaml.safe_load(f)
+        cache_path = candle_cache_path(config)
+        if os.path.exists(cache_path):
+            return cache_path
+        logger = setup_logger("trading_env", "logs/trading_env.log")
+        connection_string = (
+            f"postgresql://{config['user']}:{config['password']}@"
+            f"{config['host']}:{config['port']}/{config['database']}"
+        )
+        query = """
+        SELECT timestamp_eet, open, high, low, close, volume
+        FROM eurusd_15min
+        ORDER BY timestamp_eet
+        """
+        # Binary protocol into Arrow buffers, no per-row Python objects or text parsing
+        table = cx.read_sql(connection_string, query, return_type="arrow")
+        logger.info(f"Exported {table.num_rows} candles from PostgreSQL")
+        if table.num_rows == 0:
+            return None
+        # Write to a temp file first so parallel envs never read a partial cache
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, cache_path)
+        logger.info(f"Cached candles to {cache_path}")
+        return cache_path
+
+    @classmethod
+    def _load_data(cls, config_path):
+        """Load EURUSD 15-min data from the parquet cache of PostgreSQL."""
+        logger = setup_logger("trading_env", "logs/trading_env.log")
         try:
-            with open(config_path, 'r') as f:
-                config = yaml.safe_load(f)
-            connection_string = (
-                f"postgresql+psycopg2://{config['user']}:{config['password']}@"
-                f"{config['host']}:{config['port']}/{config['database']}"
-            )
-            engine = create_engine(connection_string)
-            query = """
-            SELECT timestamp_eet, open, high, low, close, volume
-            FROM eurusd_15min
-            ORDER BY timestamp_eet;
-            """
-            df = pd.read_sql(query, engine)
-            engine.dispose()
-            self.logger.info(f"Loaded {len(df)} candles from PostgreSQL")
+            cache_path = cls._ensure_cache(config_path)
+            if cache_path is None:
+                return pd.DataFrame()
+            # Memory-mapped reads let parallel envs share the OS page cache
+            df = pd.read_parquet(cache_path, memory_map=True)
+            logger.info(f"Loaded {len(df)} candles from {cache_path}")
             return df
         except Exception as e:
-            self.logger.error(f"Error loading data: {e}")
+            logger.error(f"Error loading data: {e}")
             return pd.DataFrame()
 
-    def _add_indicators(self):
-        """Add SMA and RSI indicators."""
+    @classmethod
+    def _add_indicators(cls, df):
+        """Add SMA and RSI indicators in place on a freshly loaded frame."""
+        logger = setup_logger("trading_env", "logs/trading_env.log")
         try:
-            df = self.df.copy()
-            df["sma_20"] = SMAIndicator(df["close"], window=20).sma_indicator()
-            df["rsi_14"] = RSIIndicator(df["close"], window=14).rsi()
+            df["sma_20"] = df["close"].rolling(window=20).mean()
+            df["rsi_14"] = _rsi(df["close"].to_numpy(dtype=np.float64), 14)
             df = df.dropna().reset_index(drop=True)
-            self.logger.info(f"Added indicators, {len(df)} candles after dropping NaN")
+            logger.info(f"Added indicators, {len(df)} candles after dropping NaN")
             return df
         except Exception as e:
-            self.logger.error(f"Error adding indicators: {e}")
-            return self.df
+            logger.error(f"Error adding indicators: {e}")
+            return df
 
-    def reset(self, **kwargs):
+    def reset(self, seed=None, options=None):
         """Reset environment for a new episode."""
-        self.start_step = np.random.randint(0, len(self.df) - self.episode_length)
+        # Per-env PCG64 generator from gymnasium, seeded by SB3's vec env seeding
+        super().reset(seed=seed)
+        self.start_step = int(self.np_random.integers(0, self._n_valid_starts))
         self.current_step = self.start_step
         self.balance = self.initial_balance
         self.equity = self.initial_balance
@@ -94,115 +252,68 @@ class TradingEnv(gym.Env):
         self.daily_loss = 0
         self.max_equity = self.initial_balance
         self.done = False
-        self.logger.info(f"Reset episode at step {self.current_step}")
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(f"Reset episode at step {self.current_step}")
         return self._get_obs(), {}
 
     def _get_obs(self):
-        """Get current observation."""
-        row = self.df.iloc[self.current_step]
-        return np.array([
-            row["open"],
-            row["high"],
-            row["low"],
-            row["close"],
-            row["volume"],
-            row["sma_20"],
-            row["rsi_14"]
-        ], dtype=np.float32)
+        """Get current observation (a copy, so callers can keep or modify it)."""
+        return self._obs_matrix[self.current_step].copy()
 
     def step(self, action):
         """Execute one step in the environment."""
         if self.done:
             return self._get_obs(), 0, True, False, {}
 
-        self.current_step += 1
-        current_price = self.df.iloc[self.current_step]["close"]
-        reward = 0
-        info = {}
-        truncated = False
-
-        # Update position and equity
-        if self.position != 0:
-            price_diff = (current_price - self.entry_price) * (1 if self.position == 1 else -1)
-            profit = price_diff * self.lot_size * 100000  # Pips to USD
-            self.equity = self.balance + profit
-        else:
-            self.equity = self.balance
-
-        # Calculate drawdowns
-        daily_drawdown = (self.max_equity - self.equity) / self.max_equity
-        overall_drawdown = (self.initial_balance - self.equity) / self.initial_balance
-        self.max_equity = max(self.max_equity, self.equity)
-
-        # Execute action
-        if action == 0 and self.position != 1:  # Buy
-            if self.position == -1:  # Close short
-                self.balance = self.equity
-            self.position = 1
-            self.entry_price = current_price + self.spread
+        prev_max_equity = self.max_equity
+        (
+            self.current_step, reward, self.position, self.entry_price, self.balance,
+            self.equity, self.max_equity, self.done, truncated, events
+        ) = _step_numba(
+            self._close, self._trend_reward, self.current_step, self.start_step,
+            self.episode_length, int(action), self.position, float(self.entry_price),
+            float(self.balance), float(self.max_equity), float(self.initial_balance),
+            self.pip_value, self.spread, self.daily_drawdown_limit,
+            self.overall_drawdown_limit, self.profit_target
+        )
+
+        if events:
+            self._log_events(events, prev_max_equity)
+
+        return self._get_obs(), reward, self.done, truncated, {}
+
+    def _log_events(self, events, prev_max_equity):
+        """Log the events flagged by _step_numba, skipping disabled info messages."""
+        log_info = self.logger.isEnabledFor(logging.INFO)
+        if log_info and events & EVENT_BUY:
             self.logger.info(f"Buy at {self.entry_price}")
-        elif action == 1 and self.position != -1:  # Sell
-            if self.position == 1:  # Close long
-                self.balance = self.equity
-            self.position = -1
-            self.entry_price = current_price - self.spread
+        if log_info and events & EVENT_SELL:
             self.logger.info(f"Sell at {self.entry_price}")
-        elif action == 2:  # Hold
-            pass
-
-        # Reward function
-        if self.position != 0:
-            price_diff = (current_price - self.entry_price) * (1 if self.position == 1 else -1)
-            reward = price_diff * self.lot_size * 100000  # Profit in USD
-            # Penalize overbought/oversold RSI
-            rsi = self.df.iloc[self.current_step]["rsi_14"]
-            if rsi > 70 and self.position == 1:  # Overbought, long
-                reward -= 50
-            elif rsi < 30 and self.position == -1:  # Oversold, short
-                reward -= 50
-            # Reward trend alignment
-            sma = self.df.iloc[self.current_step]["sma_20"]
-            if current_price > sma and self.position == 1:  # Bullish, long
-                reward += 10
-            elif current_price < sma and self.position == -1:  # Bearish, short
-                reward += 10
-
-        # Check drawdown limits
-        if daily_drawdown > self.daily_drawdown_limit:
-            reward -= 1000  # Heavy penalty
-            self.done = True
+        if events & EVENT_DAILY_DRAWDOWN:
+            daily_drawdown = (prev_max_equity - self.equity) / prev_max_equity
             self.logger.warning(f"Daily drawdown exceeded: {daily_drawdown*100:.2f}%")
-        if overall_drawdown > self.overall_drawdown_limit:
-            reward -= 1000
-            self.done = True
+        if events & EVENT_OVERALL_DRAWDOWN:
+            overall_drawdown = (self.initial_balance - self.equity) / self.initial_balance
             self.logger.warning(f"Overall drawdown exceeded: {overall_drawdown*100:.2f}%")
-
-        # Check profit target
-        profit = (self.equity - self.initial_balance) / self.initial_balance
-        if profit >= self.profit_target:
-            reward += 1000  # Bonus
-            self.done = True
+        if log_info and events & EVENT_PROFIT_TARGET:
+            profit = (self.equity - self.initial_balance) / self.initial_balance
             self.logger.info(f"Profit target reached: {profit*100:.2f}%")
-
-        # Check episode end
-        if self.current_step >= self.start_step + self.episode_length or self.current_step >= len(self.df) - 1:
-            self.done = True
-            truncated = True
+        if log_info and events & EVENT_EPISODE_END:
             self.logger.info("Episode ended")
 
-        return self._get_obs(), reward, self.done, truncated, info
-
     def render(self):
         """Render current state (for debugging)."""
-        row = self.df.iloc[self.current_step]
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        step = self.current_step
         self.logger.info(
-            f"Step: {self.current_step}, Price: {row['close']}, "
+            f"Step: {step}, Price: {self._close[step]}, "
             f"Balance: {self.balance:.2f}, Equity: {self.equity:.2f}, "
-            f"Position: {self.position}, SMA: {row['sma_20']:.5f}, RSI: {row['rsi_14']:.2f}"
+            f"Position: {self.position}, SMA: {self._sma[step]:.5f}, RSI: {self._rsi[step]:.2f}"
         )
 
 if __name__ == "__main__":
-    env = TradingEnv()
+    env = TradingEnv(log_level=logging.INFO)
     obs, _ = env.reset()
     done = False
     while not done:
@@ -1 +1,7 @@
-# Placeholder for helpers.py
+import os
+import re
+
+def candle_cache_path(config):
+    """Parquet cache path for the eurusd_15min table of the database in a db config."""
+    source = f"{config['host']}_{config['port']}_{config['database']}"
+    return os.path.join("data", f"eurusd_15min_{re.sub(r'[^A-Za-z0-9_.-]', '_', source)}.parquet")
\ No newline at end of file